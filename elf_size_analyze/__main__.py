@@ -15,7 +15,8 @@
 # and adds some more data visualization options. Parsing has been updated to use
 # regular expressions as it is much more robust solution.
 
-import itertools
+import concurrent.futures
+import functools
 import json
 import logging
 import math
@@ -59,6 +60,7 @@ def main():
         print('No memory type action specified (RAM/ROM or special). See -h for help.')
         return result
 
+    @functools.lru_cache(maxsize=None)
     def get_exe(name):
         cmd = args.toolchain_triplet + name
         if 'Windows' == platform.system():
@@ -67,31 +69,32 @@ def main():
             'Executable "%s" could not be found!' % cmd
         return args.toolchain_triplet + name
 
+    # load symbols, their file info and section info, these are independent
+    # so the binutils programs can run in parallel
+    readelf_exe, nm_exe = get_exe('readelf'), get_exe('nm')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        symbols = executor.submit(Symbol.extract_elf_symbols_info, args.elf, readelf_exe)
+        fileinfo = executor.submit(extract_elf_symbols_fileinfo, args.elf, nm_exe)
+        sections = executor.submit(Section.extract_sections_info, args.elf, readelf_exe)
+        symbols, fileinfo, sections = symbols.result(), fileinfo.result(), sections.result()
+
     # process symbols
-    symbols = Symbol.extract_elf_symbols_info(args.elf, get_exe('readelf'))
-    fileinfo = extract_elf_symbols_fileinfo(args.elf, get_exe('nm'))
     add_fileinfo_to_symbols(fileinfo, symbols)
 
     # demangle only after fileinfo extraction!
     if not args.no_demangle:
         demangle_symbol_names(symbols, get_exe('c++filt'))
 
-    # load section info
-    sections = Section.extract_sections_info(args.elf, get_exe('readelf'))
-    sections_dict = {sec.num: sec for sec in sections}
-
     def prepare_tree(symbols):
         tree = SymbolsTreeByPath(symbols)
-        if not args.no_merge_paths:
-            tree.merge_paths(args.fish_paths)
-        if not args.no_cumulative_size:
-            tree.accumulate_sizes()
         if args.sort_by_name:
-            tree.sort(key=lambda symbol: symbol.name, reverse=False)
+            sort_key, reverse = lambda symbol: symbol.name, False
         else:  # sort by size
-            tree.sort(key=lambda symbol: symbol.size, reverse=True)
-        if not args.no_totals:
-            tree.calculate_total_size()
+            sort_key, reverse = lambda symbol: symbol.size, True
+        tree.finalize(merge=not args.no_merge_paths, fish_like=args.fish_paths,
+                      accumulate=not args.no_cumulative_size,
+                      sort_key=sort_key, reverse=reverse,
+                      totals=not args.no_totals)
 
         return tree
 
@@ -100,37 +103,35 @@ def main():
         lines = tree.generate_printable_lines(
             header=header, colors=not args.no_color, human_readable=args.human_readable,
             max_width=args.max_width, min_size=min_size, alternating_colors=args.alternating_colors)
-        for line in lines:
-            line.print()
+        SymbolsTreeByPath.Protoline.print_all(lines)
 
     def print_json(header, tree):
         min_size = math.inf if args.files_only else args.min_size
         nodedict = tree._generate_node_dict(min_size=min_size)
-
-        print(json.dumps(nodedict))
+        json.dump(nodedict, sys.stdout, separators=(',', ':'))
+        sys.stdout.write('\n')
 
     def print_html(header, tree):
         min_size = math.inf if args.files_only else args.min_size
         nodedict = tree._generate_node_dict(min_size=min_size)
         title = f"ELF size information for {os.path.basename(args.elf)} - {header}"
-        html = generate_html_output(nodedict, title, args.css)
-        print(html)
+        generate_html_output(nodedict, title, args.css, out=sys.stdout)
 
 
     def filter_symbols(section_key):
-        secs = filter(section_key, sections)
+        secs = [sec for sec in sections if section_key(sec)]
         secs_str = ', '.join(s.name for s in secs)
         log.info('Considering sections: ' + secs_str)
-        filtered = filter(lambda symbol: section_key(sections_dict.get(symbol.section, None)),
-                          symbols)
-        out, test = itertools.tee(filtered)
-        if len(list(test)) == 0:
+        # evaluate section_key once per section, not once per symbol
+        nums = {sec.num for sec in secs}
+        filtered = [symbol for symbol in symbols if symbol.section in nums]
+        if not filtered:
             print("""
 ERROR: No symbols from given section found or all were ignored!
        Sections were: %s
             """.strip() % secs_str, file=sys.stderr)
             sys.exit(1)
-        return out
+        return filtered
 
     if args.print_sections:
         Section.print(sections)
@@ -149,9 +150,9 @@ ERROR: No symbols from given section found or all were ignored!
         print_func('RAM', prepare_tree(filter_symbols(lambda sec: sec and sec.occupies_ram())))
 
     if args.use_sections:
-        nums = list(map(int, args.use_sections))
+        nums = frozenset(map(int, args.use_sections))
         #  secs = list(filter(lambda s: s.num in nums, sections))
-        name = 'SECTIONS: %s' % ','.join(map(str, nums))
+        name = 'SECTIONS: %s' % ','.join(map(str, sorted(nums)))
         print_func(name, prepare_tree(filter_symbols(lambda sec: sec and sec.num in nums)))
 
     return 0
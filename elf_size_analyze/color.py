@@ -10,6 +10,8 @@ class Color:
     Class for easy color codes manipulations.
     """
 
+    __slots__ = ('color_codes', '_string')
+
     _base_string = '\033[%sm'
     _colors = {
         'BLACK':   0,
@@ -24,9 +26,11 @@ class Color:
 
     def __init__(self, color_codes=[]):
         try:
-            self.color_codes = set(color_codes)
+            self.color_codes = frozenset(color_codes)
         except TypeError:
-            self.color_codes = set([color_codes])
+            self.color_codes = frozenset([color_codes])
+        # colors are immutable, so the escape sequence can be built only once
+        self._string = self._base_string % ';'.join(str(c) for c in self.color_codes)
 
     def __add__(self, other):
         if isinstance(other, Color):
@@ -41,10 +45,10 @@ class Color:
         return NotImplemented
 
     def __str__(self):
-        return self._base_string % ';'.join(str(c) for c in self.color_codes)
+        return self._string
 
     def __repr__(self):
-        return 'Color(%s)' % self.color_codes
+        return 'Color(%s)' % set(self.color_codes)
 
 
 # should probably be done in a metaclass or something
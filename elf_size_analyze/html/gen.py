@@ -2,42 +2,43 @@
 Generator functions for HTML output
 """
 
+import functools
+import io
 import os
+import sys
 
 THIS_DIR = os.path.dirname(os.path.abspath(os.path.realpath(__file__)))
 DEFAULT_CSS = os.path.join(THIS_DIR, 'styles.css')
 JAVASCRIPT = os.path.join(THIS_DIR, 'index.js')
 
-def generate_html_output(node_dict, title, custom_css=None):
-    table_content = ""
+# same replacements as html.escape(s, quote=True), but done in a single pass
+_HTML_ESCAPE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+})
 
-    custom_css = custom_css or DEFAULT_CSS
-    with open(custom_css, encoding='utf-8') as f:
-        css_styles = f.read()
 
-    with open(JAVASCRIPT, encoding='utf-8') as f:
-        javascript = f.read()
+@functools.lru_cache(maxsize=None)
+def _read_text(path):
+    # css/js files are read only once even if multiple reports are generated
+    with open(path, encoding='utf-8') as f:
+        return f.read()
 
-    def _print_children(node, level=0):
-        nonlocal table_content
-        for x, y in node.items():
-            table_content += f"""
-            <tr class="collapsible level-{level}">
-                <td style='padding-left:{10*level}px;word-break:break-all;word-wrap:break-word'>{x}</td>
-                <td width='200px' align='right'>{y['cumulative_size']}</td>
-            </tr>
-    """
-
-            if "children" in y:
-                _print_children(y["children"], level + 1)
 
-    _print_children(node_dict)
+def generate_html_output(node_dict, title, custom_css=None, out=None):
+    """
+    Writes the HTML report to `out` (sys.stdout by default) as it is being generated.
+    """
+    out = out or sys.stdout
+    title = title.translate(_HTML_ESCAPE)
 
-    overall_size = 0
-    for x,y in node_dict.items():
-        overall_size = overall_size + y["cumulative_size"]
+    css_styles = _read_text(custom_css or DEFAULT_CSS)
+    javascript = _read_text(JAVASCRIPT)
 
-    html_output = f"""
+    out.write(f"""
 <!DOCTYPE html>
 <html lang="en">
     <head>
@@ -57,14 +58,47 @@ def generate_html_output(node_dict, title, custom_css=None):
             <button class="more">More</button>
             <span>or click on rows</span>
         </div>
-        <table>{table_content}
+        <table>""")
+
+    # depth-first traversal with an explicit stack of child iterators,
+    # deep path hierarchies could otherwise hit the recursion limit
+    overall_size = None
+    stack = [(iter(node_dict.items()), 0)]
+    while stack:
+        children, level = stack[-1]
+        for x, y in children:
+            # sizes are None if they have not been accumulated
+            size = y['cumulative_size']
+            if level == 0 and size is not None:
+                overall_size = (overall_size or 0) + size
+            out.write(f"""
+            <tr class="collapsible level-{level}">
+                <td style='padding-left:{10*level}px;word-break:break-all;word-wrap:break-word'>{x.translate(_HTML_ESCAPE)}</td>
+                <td width='200px' align='right'>{'-' if size is None else size}</td>
+            </tr>
+    """)
+
+            if "children" in y:
+                stack.append((iter(y["children"].items()), level + 1))
+                break
+        else:
+            stack.pop()
+
+    out.write(f"""
             <tr>
                 <td align="right"><b>Overall size in bytes</b></td>
-                <td align="right">{overall_size}</td>
+                <td align="right">{'-' if overall_size is None else overall_size}</td>
             </tr>
         </table>
     </body>
 </html>
-"""
+""")
+
 
-    return html_output
+def generate_html_output_str(node_dict, title, custom_css=None):
+    """
+    Same as generate_html_output() but returns the HTML report as a string.
+    """
+    out = io.StringIO()
+    generate_html_output(node_dict, title, custom_css, out=out)
+    return out.getvalue()
@@ -9,12 +9,27 @@ def named_group(name, regex):
 
 # print human readable size
 # https://stackoverflow.com/questions/1094841/reusable-library-to-get-human-readable-version-of-file-size
+_SIZE_UNITS = ('', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi', 'Yi')
+
+
 def sizeof_fmt(num, suffix='B'):
-    for unit in ['', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi']:
-        if abs(num) < 1024.0:
-            suffix_str = unit + suffix
-            return "%3.1f %-3s" % (num, suffix_str)
-        num /= 1024.0
-    unit = 'Yi'
-    suffix_str = unit + suffix
-    return "%3.1f %-3s" % (num, suffix_str)
\ No newline at end of file
+    # every unit is 2^10 times the previous one, so the unit index can be
+    # computed directly from the bit length of the integer part
+    i = min(len(_SIZE_UNITS) - 1, max(0, (int(abs(num)).bit_length() - 1) // 10))
+    return "%3.1f %-3s" % (num / (1 << (10 * i)), _SIZE_UNITS[i] + suffix)
+
+
+# iterate over a (subprocess) text stream in chunks that contain only whole lines
+def iter_line_chunks(stream, chunk_size=64 * 1024):
+    # large reads instead of reading line by line; errors (e.g. decoding) propagate to the caller
+    rest = ''
+    for chunk in iter(lambda: stream.read(chunk_size), ''):
+        # the last line of a chunk may be incomplete, it is continued by the next one
+        end = chunk.rfind('\n') + 1
+        if end == 0:
+            rest += chunk
+            continue
+        yield rest + chunk[:end]
+        rest = chunk[end:]
+    if rest:
+        yield rest
@@ -76,13 +76,21 @@ class Section:
         X86_64_LARGE = 'l'
         GNU_RETAIN = 'R'
 
+        _names = None
+
         @classmethod
         def to_string(cls, flag):
-            for name, value in vars(cls).items():
-                if not name.startswith('_'):
-                    if value == flag:
-                        return name
-            return None
+            if cls._names is None:  # build the reverse mapping on first use
+                cls._names = {value: name for name, value in vars(cls).items()
+                              if not name.startswith('_') and isinstance(value, str)}
+            return cls._names.get(flag)
+
+    # every flag character gets its own bit, so that flags are checked with a bitmask
+    _flag_bits = {flag: 1 << i for i, flag in enumerate(
+        value for name, value in vars(Flag).items()
+        if not name.startswith('_') and isinstance(value, str))}
+    _WRITE_BIT = _flag_bits[Flag.WRITE]
+    _ALLOC_BIT = _flag_bits[Flag.ALLOC]
 
     def __init__(self, **kwargs):
         self.num = kwargs['num']
@@ -96,22 +104,25 @@ class Section:
         self.link = kwargs['link']
         self.info = kwargs['info']
         self.alignment = kwargs['alignment']
+        self._flags_mask = 0
+        for flag in self.flags:
+            self._flags_mask |= self._flag_bits.get(flag, 0)
 
     def is_writable(self):
-        return self.Flag.WRITE in self.flags
+        return bool(self._flags_mask & self._WRITE_BIT)
 
     def occupies_memory(self):
         # these are the only relevant sections for us
-        return self.Flag.ALLOC in self.flags
+        return bool(self._flags_mask & self._ALLOC_BIT)
 
     # these two methods are probably a big simplification
     # as they may be true only for small embedded systems
     def occupies_rom(self):
-        return self.occupies_memory() and \
-            self.type not in ['NOBITS']
+        return self.occupies_memory() and self.type != 'NOBITS'
 
     def occupies_ram(self):
-        return self.occupies_memory() and self.is_writable()
+        mask = self._ALLOC_BIT | self._WRITE_BIT
+        return self._flags_mask & mask == mask
 
     @classmethod
     def from_readelf_line(cls, line):
@@ -120,7 +131,7 @@ class Section:
         """
         m = cls.pattern.match(line)
         if not m:
-            log.debug('no match: ' + line.strip())
+            log.debug('no match: %s', line.strip())
             return None
 
         # convert non-string values
@@ -169,8 +180,11 @@ class Section:
 
         # parse lines
         log.info('Using readelf sections regex: %s' % cls.pattern.pattern)
-        sections = [Section.from_readelf_line(l) for l in readelf_proc.stdout]
-        sections = list(filter(None, sections))
+        sections = []
+        for line in readelf_proc.stdout:
+            section = Section.from_readelf_line(line)
+            if section is not None:
+                sections.append(section)
 
         if readelf_proc.wait(3) != 0:
             raise subprocess.CalledProcessError(readelf_proc.returncode,
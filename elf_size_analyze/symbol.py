@@ -6,8 +6,9 @@ import logging
 import os
 import re
 import subprocess
+import sys
 
-from elf_size_analyze.misc import named_group
+from elf_size_analyze.misc import iter_line_chunks, named_group
 
 log = logging.getLogger('elf-size-analyze')
 
@@ -17,6 +18,10 @@ class Symbol:
     of readelf command. Additionally, has optional file path and line number.
     """
 
+    # there is one object for every symbol in the ELF file, so avoid per-instance dicts
+    __slots__ = ('num', 'name', 'value', 'size', 'type', 'bind', 'visibility', 'section',
+                 'file', 'line')
+
     def __init__(self, num, name, value, size, type, bind, visibility, section,
                  file=None, line=None):
         self.num = num
@@ -41,83 +46,119 @@ class Symbol:
     #   ...
     #      565: 08002bf9     2 FUNC    WEAK   DEFAULT    2 TIM2_IRQHandler
     #      566: 200002a8    88 OBJECT  GLOBAL DEFAULT    8 hspi1
+    # fields are separated only by spaces/tabs, so that with re.MULTILINE
+    # a match never crosses line boundaries (e.g. for symbols without a name)
     pattern_fields = [
-        r'\s*',
+        r'[ \t]*',
         named_group('num', r'\d+'), r':',
-        r'\s+',
+        r'[ \t]+',
         named_group('value', r'[0-9a-fA-F]+'),
-        r'\s+',
-        named_group('size', r'(0x)?[0-9A-Fa-f][0-9A-Fa-f]*'), # accept dec & hex numbers
-        r'\s+',
+        r'[ \t]+',
+        named_group('size', r'(?:0x[0-9a-fA-F]+|[0-9]+)'), # accept dec & hex numbers
+        r'[ \t]+',
         named_group('type', r'\S+'),
-        r'\s+',
+        r'[ \t]+',
         named_group('bind', r'\S+'),
-        r'\s+',
+        r'[ \t]+',
         named_group('visibility', r'\S+'),
-        r'\s+',
+        r'[ \t]+',
         named_group('section', r'\S+'),
-        r'\s+',
+        r'[ \t]+',
         named_group('name', r'.*'),
     ]
     pattern = r'^{}$'.format(r''.join(pattern_fields))
-    pattern = re.compile(pattern)
+    # readelf output is ASCII apart from symbol names, ASCII classes are faster to match;
+    # multiline mode allows matching all lines of readelf output with a single finditer()
+    pattern = re.compile(pattern, re.ASCII | re.MULTILINE)
+
+    # lower-case, to avoid converting the list on every call
+    _default_ignored_types = frozenset(['notype', 'section', 'file'])
 
     @classmethod
-    def from_readelf_line(cls, line,
-                          ignored_types=['NOTYPE', 'SECTION', 'FILE'],
-                          ignore_zero_size=True):
+    def from_readelf_line(cls, line, ignored_types=None, ignore_zero_size=True):
         """
         Create a Symbol from a line of `readelf -Ws` output.
+        ignored_types - symbol types to ignore (case-insensitive), NOTYPE, SECTION and FILE by default
         """
+        if ignored_types is None:
+            ignored_types = cls._default_ignored_types
+        else:
+            ignored_types = {t.lower() for t in ignored_types}
+
         m = cls.pattern.match(line)
         if not m:
-            log.debug('no match: ' + line.strip())
+            log.debug('no match: %s', line.strip())
             return None
+        return cls._from_match(m, ignored_types, ignore_zero_size)
+
+    @classmethod
+    def _from_match(cls, m, ignored_types, ignore_zero_size):
+        # groups() avoids creating a dict, fields are in the order of the pattern
+        num, value, size, type, bind, visibility, section, name = m.groups()
 
         # convert non-string values
-        m = m.groupdict()
-        m['num'] = int(m['num'])
-        m['value'] = int(m['value'], 16)
-        m['size'] = int(m['size']) if m['size'].isdecimal() else int(m['size'], 16)
-        try:  # for numeric sections
-            m['section'] = int(m['section'])
+        try:  # readelf uses decimal sizes, unless they are too large
+            size = int(size)
         except ValueError:
-            pass
+            size = int(size, 16)
 
         # ignore if needed
-        if not m['name'].strip() \
-                or m['type'].lower() in map(str.lower, ignored_types) \
-                or (ignore_zero_size and m['size'] == 0):
-            log.debug('ignoring: ' + line.strip())
+        if not name.strip() \
+                or type.lower() in ignored_types \
+                or (ignore_zero_size and size == 0):
+            log.debug('ignoring: %s', m.group().strip())
             return None
 
-        # create the Symbol
-        s = Symbol(**m)
+        try:  # for numeric sections
+            section = int(section)
+        except ValueError:  # special sections (UND, ABS, ...) repeat a lot
+            section = sys.intern(section)
 
-        return s
+        # create the Symbol
+        return Symbol(int(num), name, int(value, 16), size, type, bind, visibility, section)
 
     @classmethod
     def extract_elf_symbols_info(cls, elf_file, readelf_exe='readelf'):
         """
         Uses binutils 'readelf' to find info about all symbols from an ELF file.
         """
+        return list(cls.iter_elf_symbols_info(elf_file, readelf_exe))
+
+    @classmethod
+    def iter_elf_symbols_info(cls, elf_file, readelf_exe='readelf'):
+        """
+        Same as extract_elf_symbols_info, but yields symbols one by one.
+        """
         flags = ['--wide', '--syms']
         readelf_proc = subprocess.Popen([readelf_exe, *flags, elf_file],
                                         stdout=subprocess.PIPE, universal_newlines=True)
 
-        # parse lines
+        # parse output while readelf is still running, it is read in large chunks
+        # and all symbol lines of a chunk are matched with a single finditer()
         log.info('Using readelf symbols regex: %s' % cls.pattern.pattern)
-        symbols = [Symbol.from_readelf_line(l) for l in readelf_proc.stdout]
-        n_ignored = len(list(filter(lambda x: x is None, symbols)))
-        symbols = list(filter(None, symbols))
-
-        if readelf_proc.wait(3) != 0:
-            raise subprocess.CalledProcessError(readelf_proc.returncode,
-                                                readelf_proc.args)
-
-        log.info('ignored %d/%d symbols' % (n_ignored, len(symbols) + n_ignored))
-
-        return symbols
+        n_lines, n_symbols = 0, 0
+        try:
+            for chunk in iter_line_chunks(readelf_proc.stdout):
+                n_lines += chunk.count('\n') + (not chunk.endswith('\n'))
+                for m in cls.pattern.finditer(chunk):
+                    symbol = cls._from_match(m, cls._default_ignored_types, ignore_zero_size=True)
+                    if symbol is not None:
+                        n_symbols += 1
+                        yield symbol
+
+            if readelf_proc.wait(3) != 0:
+                raise subprocess.CalledProcessError(readelf_proc.returncode,
+                                                    readelf_proc.args)
+        finally:
+            # also when parsing failed or the generator has been closed early
+            readelf_proc.stdout.close()
+            if readelf_proc.poll() is None:
+                readelf_proc.kill()
+                readelf_proc.wait()
+
+        # lines that did not match (headers, empty lines) are counted as ignored too
+        n_ignored = n_lines - n_symbols
+        log.info('ignored %d/%d symbols' % (n_ignored, n_symbols + n_ignored))
 
 
 def detect_nm_is_llvm(nm_exe):
@@ -131,51 +172,54 @@ def detect_nm_is_llvm(nm_exe):
     return False
 
 
+# Regexes for parsing nm output lines
+# We use Posix mode, so lines should be in form:
+#   NAME TYPE VALUE SIZE[\tFILE[:LINE]]
+# e.g.
+#   MemManage_Handler T 08004130 00000002	/some/path/file.c:80
+#   memset T 08000bf0 00000010
+_GNU_NM_FLAGS = ['--portability', '--line-numbers']
+_GNU_NM_RE = re.compile(r'^{}$'.format(r''.join([
+    named_group('name', r'\S+'),
+    r'\s+',
+    named_group('type', r'\S+'),
+    r'\s+',
+    named_group('value', r'[0-9a-fA-F]+'),
+    r'\s+',
+    named_group('size', r'[0-9a-fA-F]+'),
+    named_group('fileinfo', r'.*'),
+])))
+# llvm-nm version of output:
+#   /some/path/file.c: memset t 800a2ea 6e
+_LLVM_NM_FLAGS = ['--portability', '--print-file-name']
+_LLVM_NM_RE = re.compile(r'^{}$'.format(r''.join([
+    named_group('fileinfo', r'[^:]*'),
+    r':\s+',
+    named_group('name', r'\S+'),
+    r'\s+',
+    named_group('type', r'\S+'),
+    r'\s+',
+    named_group('value', r'[0-9a-fA-F]+'),
+    r'\s+',
+    named_group('size', r'[0-9a-fA-F]+'),
+])))
+# nm flags and output regex, by whether it is llvm-nm
+_NM_FORMATS = {
+    False: (_GNU_NM_FLAGS, _GNU_NM_RE),
+    True: (_LLVM_NM_FLAGS, _LLVM_NM_RE),
+}
+
+
 def extract_elf_symbols_fileinfo(elf_file, nm_exe='nm'):
     """
     Uses binutils 'nm' to find files and lines where symbols from an ELF
     executable were defined.
     """
-    # Regex for parsing nm output lines
-    # We use Posix mode, so lines should be in form:
-    #   NAME TYPE VALUE SIZE[\tFILE[:LINE]]
-    # e.g.
-    #   MemManage_Handler T 08004130 00000002	/some/path/file.c:80
-    #   memset T 08000bf0 00000010
-    gnu_flags = ['--portability', '--line-numbers']
-    llvm_flags = ['--portability', '--print-file-name']
-    gnu_fields = [
-        named_group('name', r'\S+'),
-        r'\s+',
-        named_group('type', r'\S+'),
-        r'\s+',
-        named_group('value', r'[0-9a-fA-F]+'),
-        r'\s+',
-        named_group('size', r'[0-9a-fA-F]+'),
-        named_group('fileinfo', r'.*'),
-    ]
-    # llvm-nm version of output:
-    #   /some/path/file.c: memset t 800a2ea 6e
-    llvm_fields = [
-        named_group('fileinfo', r'[^:]*'),
-        r':\s+',
-        named_group('name', r'\S+'),
-        r'\s+',
-        named_group('type', r'\S+'),
-        r'\s+',
-        named_group('value', r'[0-9a-fA-F]+'),
-        r'\s+',
-        named_group('size', r'[0-9a-fA-F]+'),
-    ]
-
-    is_llvm = detect_nm_is_llvm(nm_exe)
-    flags, fields = (llvm_flags, llvm_fields) if is_llvm else (gnu_flags, gnu_fields)
-
-    pattern = r'^{}$'.format(r''.join(fields))
-    pattern = re.compile(pattern)
+    flags, pattern = _NM_FORMATS[detect_nm_is_llvm(nm_exe)]
     log.info('Using nm symbols regex: %s' % pattern.pattern)
 
-    nm_proc = subprocess.Popen([nm_exe, *flags, elf_file],
+    # large buffer, so that the output is read with fewer system calls
+    nm_proc = subprocess.Popen([nm_exe, *flags, elf_file], bufsize=1 << 20,
                                stdout=subprocess.PIPE, universal_newlines=True)
 
     # process nm output
@@ -190,14 +234,13 @@ def extract_elf_symbols_fileinfo(elf_file, nm_exe='nm'):
         fileinfo = m.group('fileinfo').strip()
         if len(fileinfo) > 0:
             # check for line number
-            line_i = fileinfo.rfind(':')
-            if line_i >= 0:
-                file = fileinfo[:line_i]
-                line = int(fileinfo[line_i + 1])
+            head, sep, tail = fileinfo.rpartition(':')
+            if sep and tail.isdecimal():
+                file, line = head, int(tail)
             else:
                 file = fileinfo
-            # try to make the path more readable
-            file = os.path.normpath(file)
+            # try to make the path more readable, intern as many symbols share the same file
+            file = sys.intern(os.path.normpath(file))
 
         fileinfo_dict[m.group('name')] = file, line
 
@@ -214,8 +257,8 @@ def add_fileinfo_to_symbols(fileinfo_dict, symbols_list):
     for symbol_name, (file, line) in fileinfo_dict.items():
         if file is None and line is None:
             continue
-        if symbol_name in symbols_dict:
-            symbol = symbols_dict[symbol_name]
+        symbol = symbols_dict.get(symbol_name)
+        if symbol is not None:
             symbol.file = file
             symbol.line = line
         else:
@@ -231,16 +274,14 @@ def demangle_symbol_names(symbols, cppfilt_exe='c++filt'):
     cppfilt_proc = subprocess.Popen(
         [cppfilt_exe, *flags], stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
 
-    for symbol in symbols:
-        # write the line and flush it
-        # not super-efficient but writing all at once for large list of symbols
-        # can block the program (probably due to buffering)
-        cppfilt_proc.stdin.write((symbol.name + '   \n'))
-        cppfilt_proc.stdin.flush()
-        new_name = cppfilt_proc.stdout.readline().strip()
-        symbol.name = new_name
-    cppfilt_proc.stdin.close()
-
-    if cppfilt_proc.wait(3) != 0:
+    # pass all names at once, communicate() writes and reads concurrently so that
+    # the pipe buffers filling up cannot block either side
+    names = ''.join(symbol.name + '\n' for symbol in symbols)
+    output, _ = cppfilt_proc.communicate(names)
+
+    if cppfilt_proc.returncode != 0:
         raise subprocess.CalledProcessError(cppfilt_proc.returncode,
                                             cppfilt_proc.args)
+
+    for symbol, new_name in zip(symbols, output.split('\n')):
+        symbol.name = new_name.strip()
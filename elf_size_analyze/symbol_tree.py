@@ -2,11 +2,11 @@
 The symbol tree class
 """
 
-import itertools
+import functools
 import logging
 import math
 import os
-import pathlib
+import sys
 
 from elf_size_analyze.color import Color
 from elf_size_analyze.misc import sizeof_fmt
@@ -15,35 +15,97 @@ from elf_size_analyze.tree import TreeNode
 
 log = logging.getLogger('elf-size-analyze')
 
+_RESET = str(Color.RESET)
+_color_prefixes = {}
+
+
+def _color_prefix(colors):
+    """
+    Escape sequence for the given colors combined. Cached, as there are only
+    a few different combinations used for printing.
+    """
+    if len(colors) == 1:  # most lines, the string of a single color is already cached
+        return str(colors[0])
+    key = tuple(colors)
+    prefix = _color_prefixes.get(key)
+    if prefix is None:
+        prefix = _color_prefixes[key] = str(sum(colors, Color()))
+    return prefix
+
+
+@functools.lru_cache(maxsize=None)
+def _path_parts(path):
+    """
+    Split path into components like pathlib.Path(path).parts, but without creating Path
+    objects. Cached, as usually many symbols are defined in the same file.
+    """
+    drive, path = os.path.splitdrive(path)
+    if os.path.altsep:
+        path = path.replace(os.path.altsep, os.path.sep)
+    root = ''
+    if path.startswith(os.path.sep):
+        # POSIX allows implementation-defined meaning of exactly 2 leading slashes
+        two_slashes = os.path.sep * 2
+        if os.name == 'posix' and path.startswith(two_slashes) and not path.startswith(two_slashes + os.path.sep):
+            root = two_slashes
+        else:
+            root = os.path.sep
+    parts = [sys.intern(part) for part in path.split(os.path.sep) if part and part != '.']
+    anchor = drive + root
+    if anchor:
+        parts.insert(0, sys.intern(anchor))
+    return tuple(parts)
+
 class SymbolsTreeByPath:
     """A tree built from symbols grouped by paths. Nodes can be symbols or paths."""
 
     class Node(TreeNode):
+        # node kinds, determined once on creation as the predicates are used very often
+        ROOT, DIR, FILE, SYMBOL = range(4)
+
+        __slots__ = ('data', 'kind', 'cumulative_size', '_path_children')
+
         def __init__(self, data, is_dir=False, *args, **kwargs):
             self.data = data
-            self._is_dir = is_dir
+            if data is None:
+                self.kind = self.ROOT
+            elif isinstance(data, Symbol):
+                self.kind = self.SYMBOL
+            else:
+                self.kind = self.DIR if is_dir else self.FILE
             self.cumulative_size = None  # used for accumulating symbol sizes in paths
+            # index of path children by name, for building the tree; symbols have no children
+            self._path_children = None if self.kind == self.SYMBOL else {}
             super().__init__(*args, **kwargs)
 
         def is_symbol(self):
-            return isinstance(self.data, Symbol)
+            return self.kind == self.SYMBOL
 
         def is_root(self):
-            return self.data is None
+            return self.kind == self.ROOT
 
         def is_path(self):
-            return not self.is_root() and not self.is_symbol()
+            return self.kind == self.DIR or self.kind == self.FILE
 
         def is_dir(self):
-            return self.is_path() and self._is_dir
+            return self.kind == self.DIR
 
         def is_file(self):
-            return self.is_path() and not self._is_dir
+            return self.kind == self.FILE
 
         def __repr__(self):
             string = self.data.name if self.is_symbol() else self.data
             return 'Node(%s)' % string
 
+    # line colors by node kind, symbols are colored separately as colors may alternate
+    _header_colors = [Color.BOLD, Color.BLUE]
+    _kind_colors = {
+        Node.FILE: [Color.L_BLUE],
+        Node.DIR: [Color.BLUE],
+    }
+    _symbol_colors = [Color.L_YELLOW]
+    _second_symbol_colors = [Color.L_GREEN]
+
     def __init__(self, symbols=[]):
         self.tree_root = self.Node(None)
         self.orphans = self.Node('?')
@@ -54,6 +116,8 @@ class SymbolsTreeByPath:
 
     def add(self, symbol):
         assert isinstance(symbol, Symbol), "Only instances of Symbol can be added!"
+        # accumulated sizes are no longer valid
+        self.tree_root.cumulative_size = None
         if symbol.file is None:
             self.orphans.add(self.Node(symbol))
         else:
@@ -67,42 +131,67 @@ class SymbolsTreeByPath:
         Adds the given symbol by creating nodes for each path component
         before adding symbol as the last ("leaf") node.
         """
-        path = pathlib.Path(symbol.file)
         node = self.tree_root
-        for part in path.parts:
-            # find it the part exists in children
-            path_children = filter(self.Node.is_path, node.children)
-            path_child = list(filter(lambda node: node.data == part, path_children))
-            assert len(path_child) <= 1
+        for part in _path_parts(symbol.file):
+            # find if the part exists in children
+            path_child = node._path_children.get(part)
             # if it does not exsits, then create it and add
-            if len(path_child) == 0:
+            if path_child is None:
                 path_child = self.Node(part, is_dir=True)
                 node.add(path_child)
-            else:
-                path_child = path_child[0]
+                node._path_children[part] = path_child
             # go 'into' this path part's node
             node = path_child
         # remove directory signature from last path part
-        node._is_dir = False
+        if node.is_dir():
+            node.kind = self.Node.FILE
         # last, add the symbol, the "tree leaf"
         node.add(self.Node(symbol))
 
     def merge_paths(self, fish_like=False):
         """Merges all path componenets that have only one child into single nodes."""
-        for node, depth in self.tree_root.pre_order():
-            # we want only path nodes that have only one path node
-            if node.is_path() and len(node.children) == 1:
-                child = node.children[0]
-                if child.is_path():
-                    # add this node's path to its child
-                    this_path = node.data
-                    if fish_like:
-                        head, tail = os.path.split(this_path)
-                        this_path = os.path.join(head, tail[:1])
-                    child.data = os.path.join(this_path, child.data)
-                    # remove this node and reparent its child
-                    node.parent.children.remove(node)
-                    node.parent.add(child)
+        stack = [self.tree_root]
+        while stack:
+            node = stack.pop()
+            if self._has_single_path_child(node):
+                node = self._merge_path_chain(node, fish_like)
+            # visit in pre-order, merged nodes are moved to the end of their parent's children
+            stack.extend(reversed(node.children))
+
+    @staticmethod
+    def _has_single_path_child(node):
+        return node.is_path() and len(node.children) == 1 and node.children[0].is_path()
+
+    @staticmethod
+    def _merged_path_part(path, fish_like):
+        if fish_like:
+            head, tail = os.path.split(path)
+            path = os.path.join(head, tail[:1])
+        return path
+
+    def _merge_path_chain(self, node, fish_like):
+        # find the whole chain of single-child paths and join it at once,
+        # instead of merging the path from level to level
+        chain = [node]
+        while self._has_single_path_child(chain[-1]):
+            chain.append(chain[-1].children[0])
+        last = chain.pop()
+        parts = [self._merged_path_part(n.data, fish_like) for n in chain]
+        last.data = os.path.join(*parts, last.data)
+        # remove the first node of the chain and reparent the last one
+        self._replace_path_node(node, last)
+        return last
+
+    @staticmethod
+    def _replace_path_node(node, new_node):
+        # keep the path children index consistent, so that further symbols
+        # are not added to nodes that have been removed from the tree
+        parent = node.parent
+        parent.children.remove(node)
+        if parent._path_children.get(node.data) is node:
+            del parent._path_children[node.data]
+        parent.add(new_node)
+        parent._path_children.setdefault(new_node.data, new_node)
 
     def sort(self, key, reverse=False):
         """
@@ -117,60 +206,107 @@ class SymbolsTreeByPath:
             if len(node.children) > 1:
                 nodes_with_children.append(node)
         for node in nodes_with_children:
-            # we need tee to split generators into many so that filter will work as expected
-            ch1, ch2 = itertools.tee(node.children)
-            symbols = filter(self.Node.is_symbol, ch1)
-            non_symbols = filter(lambda n: not n.is_symbol(), ch2)
-            # sort others by size if available else by name, directories first
-            # add - to size, as we need reverse sorting for path names
-            path_key = lambda node: -node.cumulative_size if node.cumulative_size is not None else node.data
-            ns1, ns2, ns3 = itertools.tee(non_symbols, 3)
-            dirs = filter(self.Node.is_dir, ns1)
-            files = filter(self.Node.is_file, ns2)
-            others = filter(lambda n: not n.is_file() and not n.is_dir(), ns3)
-            non_symbols = sorted(dirs, key=path_key) \
-                + sorted(files, key=path_key) + list(others)
-            symbols = sorted(symbols, key=lambda node: key(node.data), reverse=reverse)
-            children = list(non_symbols) + list(symbols)
-            node.children = children
+            self._sort_children(node, key, reverse)
+
+    # sort paths by size if available else by name
+    # add - to size, as we need reverse sorting for path names
+    @staticmethod
+    def _path_sort_key(node):
+        return -node.cumulative_size if node.cumulative_size is not None else node.data
+
+    def _sort_children(self, node, key, reverse):
+        # split children into groups in a single pass
+        dirs, files, others, symbols = [], [], [], []
+        for child in node.children:
+            if child.is_symbol():
+                symbols.append(child)
+            elif child.is_dir():
+                dirs.append(child)
+            elif child.is_file():
+                files.append(child)
+            else:
+                others.append(child)
+        # directories first, then files, then symbols
+        dirs.sort(key=self._path_sort_key)
+        files.sort(key=self._path_sort_key)
+        symbols.sort(key=lambda node: key(node.data), reverse=reverse)
+        node.children = dirs + files + others + symbols
 
     def accumulate_sizes(self, reset=True):
         """
         Traverse tree bottom-up to accumulate symbol sizes in paths.
+        Sizes are always calculated from scratch, `reset` is kept for compatibility.
         """
-        if reset:
-            for node, depth in self.tree_root.pre_order():
-                node.cumulative_size = None
-            # Avoid errors when there are no orphans but the root Node('?')
-            self.orphans.cumulative_size = 0
         for node, depth in self.tree_root.post_order():
-            if node.parent is None:
-                continue
-            if node.parent.cumulative_size is None:
-                node.parent.cumulative_size = 0
             if node.is_symbol():
                 node.cumulative_size = node.data.size
-            node.parent.cumulative_size += node.cumulative_size
+            else:
+                node.cumulative_size = sum(child.cumulative_size for child in node.children)
+
+    def finalize(self, merge=True, fish_like=False, accumulate=True, sort_key=None,
+                 reverse=False, totals=True):
+        """
+        Equivalent of calling merge_paths(), accumulate_sizes(), sort() and
+        calculate_total_size() (each one only if requested), but done in
+        a single bottom-up traversal of the tree.
+        """
+        total_size = 0
+        # materialize the traversal first as merging paths modifies the tree
+        for node, depth in list(self.tree_root.post_order()):
+            if node.is_symbol():
+                if accumulate:
+                    node.cumulative_size = node.data.size
+                else:
+                    total_size += node.data.size
+                continue
+            # children are already accumulated, sorted and merged (unless they
+            # are in the middle of a single-child chain) at this point
+            if accumulate:
+                node.cumulative_size = sum(child.cumulative_size for child in node.children)
+            if sort_key is not None and len(node.children) > 1:
+                self._sort_children(node, sort_key, reverse)
+            # merge whole chains at once, when reaching their first node
+            if merge and self._has_single_path_child(node) \
+                    and not self._has_single_path_child(node.parent):
+                self._merge_path_chain(node, fish_like)
+        if totals:
+            # the root accumulates sizes of all symbols, including orphans
+            self.total_size = self.tree_root.cumulative_size if accumulate else total_size
 
     def calculate_total_size(self):
-        # calculate the total size
+        # accumulated sizes are reset when adding symbols, so they are up to date if available
+        if self.tree_root.cumulative_size is not None:
+            self.total_size = self.tree_root.cumulative_size
+            return
         all_nodes = (node for node, _ in self.tree_root.pre_order())
         all_symbols = filter(self.Node.is_symbol, all_nodes)
         self.total_size = sum(s.data.size for s in all_symbols)
 
     class Protoline:
+        __slots__ = ('depth', 'node', 'string', 'field_strings', 'colors', 'color_prefix')
+
         def __init__(self, depth=0, node=None, string=None, colors=None):
             self.depth = depth
             self.node = node
             self.string = string
             self.field_strings = []
             self.colors = colors or []  # avoid creating one list shared by all objects
+            self.color_prefix = None  # escape sequence for colors, set when adding colors
 
-        def print(self):
+        def render(self):
+            """Returns the line string with color escape sequences."""
             if len(self.colors) > 0:
-                print(sum(self.colors, Color()) + self.string + Color.RESET)
-            else:
-                print(self.string)
+                prefix = self.color_prefix or _color_prefix(self.colors)
+                return prefix + self.string + _RESET
+            return self.string
+
+        def print(self):
+            sys.stdout.write(self.render() + '\n')
+
+        @staticmethod
+        def print_all(protolines):
+            """Prints all the lines with a single write instead of one per line."""
+            sys.stdout.write(''.join(line.render() + '\n' for line in protolines))
 
     def generate_printable_lines(self, *, max_width=80, min_size=0, header=None, indent=2,
                                  colors=True, alternating_colors=False, trim=True, human_readable=False):
@@ -233,6 +369,8 @@ class SymbolsTreeByPath:
         # generate dict of nodes
         nodeDict = dict()
         get_key = lambda node: node.data.name if node.is_symbol() else node.data
+        # children dicts of path nodes, in pre-order parents are always visited first
+        children_dicts = {self.tree_root: nodeDict}
 
         for node, depth in self.tree_root.pre_order():
             if node.is_root():
@@ -242,30 +380,23 @@ class SymbolsTreeByPath:
             elif node.is_symbol() and node.data.size < min_size:
                 continue
 
-            nodePath = list()
-            iterNode = node
-            while iterNode.parent is not None:
-                nodePath.append(iterNode)
-                iterNode = iterNode.parent
-            nodePath.reverse()
-
-            children = nodeDict
-            for n in nodePath[:-1]:
-                children = children[get_key(n)]['children']
-
+            children = children_dicts[node.parent]
             key = get_key(node)
             children[key] = {
-                'name': get_key(node),
+                'name': key,
                 'cumulative_size': node.cumulative_size,
             }
             if not node.is_symbol():
-                children[key]['children'] = {}
+                children[key]['children'] = children_dicts[node] = {}
 
         return nodeDict
 
     def _add_field_strings(self, protolines, indent, human_readable):
+        indents = {}  # indentation strings by depth, there are only a few different
         for line in protolines:
-            indent_str = ' ' * indent * line.depth
+            indent_str = indents.get(line.depth)
+            if indent_str is None:
+                indent_str = indents[line.depth] = ' ' * indent * line.depth
             if line.node.is_path():
                 size_str, percent_str = '-', '-'
                 if line.node.cumulative_size is not None:
@@ -284,21 +415,27 @@ class SymbolsTreeByPath:
             line.field_strings = fields
 
     def _calculate_field_sizes(self, protolines, initial, max_width=0):
-        field_sizes = initial
+        field_sizes = list(initial)
         for line in protolines:
             for i, s, in enumerate(line.field_strings):
-                field_sizes[i] = max(len(s), field_sizes[i])
+                ls = len(s)
+                if ls > field_sizes[i]:
+                    field_sizes[i] = ls
         # trim the fields if max_width is > 0
         if max_width > 0:
-            if sum(field_sizes) > max_width:
-                field_sizes[0] -= sum(field_sizes) - max_width
+            total = sum(field_sizes)
+            if total > max_width:
+                field_sizes[0] -= total - max_width
         return field_sizes
 
     def _trim_strings(self, protolines, field_sizes):
+        # other fields are as wide as their longest string, only the first one can be
+        # made narrower to fit max_width (see _calculate_field_sizes)
+        size = field_sizes[0]
+        limit = size - 3
         for line in protolines:
-            for i, s, in enumerate(line.field_strings):
-                if len(s) > field_sizes[i]:
-                    line.field_strings[i] = s[:field_sizes[i] - 3] + '...'
+            if line.field_strings and len(line.field_strings[0]) > size:
+                line.field_strings[0] = line.field_strings[0][:limit] + '...'
 
     def _create_header_protolines(self, header_fmt, table_headers, sizes_dict, header):
         table_header = header_fmt.format(*table_headers, **sizes_dict)
@@ -325,21 +462,19 @@ class SymbolsTreeByPath:
     def _add_colors(self, protolines, alternating_colors):
         second_symbol_color = False
         for line in protolines:
-            c = []
             if line.node is None:  # header lines
-                c = [Color.BOLD, Color.BLUE]
-            elif line.node.is_file():
-                c = [Color.L_BLUE]
-            elif line.node.is_dir():
-                c = [Color.BLUE]
-            elif line.node.is_symbol():
-                if second_symbol_color and alternating_colors:
-                    c = [Color.L_GREEN]
-                    second_symbol_color = False
-                else:
-                    c = [Color.L_YELLOW]
-                    second_symbol_color = True
+                c = self._header_colors
+            elif line.node.kind != self.Node.SYMBOL:
+                c = self._kind_colors.get(line.node.kind, [])
+            elif second_symbol_color and alternating_colors:
+                c = self._second_symbol_colors
+                second_symbol_color = False
+            else:
+                c = self._symbol_colors
+                second_symbol_color = True
             line.colors += c
+            if line.colors:
+                line.color_prefix = _color_prefix(line.colors)
 
     def _size_string(self, size, human_readable):
         if human_readable:
@@ -2,7 +2,6 @@
 The tree node class
 """
 
-import itertools
 import sys
 
 
@@ -13,6 +12,9 @@ class TreeNode:
     class TreeNode, as every object represents a single node.
     """
 
+    # subclasses should define __slots__ too, trees usually have many nodes
+    __slots__ = ('parent', 'children')
+
     def __init__(self, parent=None):
         self.parent = parent
         self.children = []
@@ -25,48 +27,32 @@ class TreeNode:
             child.parent = self
 
     def pre_order(self):
-        """Iterator that yields tuples (node, depth). Depth-first, pre-order traversal."""
-        return self.PreOrderIterator(self)
+        """
+        Iterator that yields tuples (node, depth). Depth-first, pre-order traversal.
+        Uses an explicit stack, so deep trees do not hit the recursion limit. Children
+        are read only after their parent has been yielded, so they may be modified then.
+        """
+        stack = [(self, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            stack.extend((child, depth + 1) for child in reversed(node.children))
 
     def post_order(self):
         """Iterator that yields tuples (node, depth). Depth-first, post-order traversal."""
-        return self.PostOrderIterator(self)
+        stack = [(self, 0, False)]
+        while stack:
+            node, depth, children_done = stack.pop()
+            if children_done:
+                yield node, depth
+            else:
+                stack.append((node, depth, True))
+                stack.extend((child, depth + 1, False) for child in reversed(node.children))
 
     def __iter__(self):
         for child in self.children:
             yield child
 
-    class TreeIterator:
-        def __init__(self, root, depth=0):
-            self.root = root
-            self.depth = depth
-
-        def __iter__(self):
-            raise NotImplementedError('Should yield pairs (node, depth)')
-
-    # depth-first tree iterators
-    class PreOrderIterator(TreeIterator):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-
-        def __iter__(self):
-            yield self.root, self.depth
-            children_iters = map(lambda child:
-                                 self.__class__(child, self.depth + 1), self.root)
-            for node in itertools.chain(*children_iters):
-                yield node
-
-    class PostOrderIterator(TreeIterator):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-
-        def __iter__(self):
-            children_iters = map(lambda child:
-                                 self.__class__(child, self.depth + 1), self.root)
-            for node in itertools.chain(*children_iters):
-                yield node
-            yield self.root, self.depth
-
 
 # only for testing the implementation
 def test__TreeNode():